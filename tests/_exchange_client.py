@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+"""
+Python 场景测试共用的交易所 HTTP 客户端
+@yutiansut @quantaxis
+
+test_all_scenarios.py / test_bidirectional_trade.py 共用，
+在 pytest 下由 conftest.py 的 session 级 client fixture 复用同一个长连接池。
+
+依赖: pip install aiohttp orjson
+"""
+
+import asyncio
+import aiohttp
+import orjson
+import os
+import re
+import time
+import uuid
+from typing import Optional, Dict, Any, List, Tuple
+
+BASE_URL = "http://127.0.0.1:8094"
+
+# 订单状态（服务端 OrderStatus 的 Debug 输出）
+ORDER_FINAL_STATUSES = frozenset({"Filled", "Cancelled", "Rejected"})
+ORDER_ACCEPTED_STATUSES = ORDER_FINAL_STATUSES | {"Submitted", "PartiallyFilled"}
+
+# 成功响应只需要其中一个 ID 字段时，直接在原始字节上匹配，跳过完整 JSON 解析
+# （ApiResponse 序列化为 {"success":true,"data":{...}}，register 的 data 同时含 account_id/user_id，分字段匹配）
+_SUCCESS_MARK = b'"success":true'
+_USER_ID_RE = re.compile(rb'"user_id"\s*:\s*"([^"]+)"')
+_ACCOUNT_ID_RE = re.compile(rb'"account_id"\s*:\s*"([^"]+)"')
+_ORDER_ID_RE = re.compile(rb'"order_id"\s*:\s*"([^"]+)"')
+
+
+def _extract_id(pattern: "re.Pattern[bytes]", body: bytes) -> Optional[str]:
+    m = pattern.search(body)
+    return m.group(1).decode() if m else None
+
+
+# 持久化测试 ID，本地多次运行复用同一批用户/账户
+TEST_ID_FILE = "/tmp/qax_test_id"
+
+
+def _read_test_id() -> str:
+    try:
+        with open(TEST_ID_FILE) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return ""
+    except OSError as e:
+        # 如共享机器上文件属于其他用户
+        raise RuntimeError(
+            f"无法读取 {TEST_ID_FILE}: {e}，请删除该文件或设置 QAX_TEST_ID"
+        ) from e
+
+
+def load_test_id() -> str:
+    """测试 ID：优先环境变量 QAX_TEST_ID，其次 /tmp/qax_test_id，都没有则新建并写入文件
+
+    新建时先写入临时文件再 os.link 到目标路径：link 在目标已存在时失败且不覆盖，
+    文件一旦可见内容就已完整，xdist 多个 worker 同时首次运行也只会采用同一个 ID。
+    """
+    test_id = os.environ.get("QAX_TEST_ID")
+    if test_id:
+        return test_id
+    test_id = _read_test_id()
+    if test_id:
+        return test_id
+    tmp_path = f"{TEST_ID_FILE}.{os.getpid()}"
+    with open(tmp_path, "w") as f:
+        f.write(uuid.uuid4().hex[:8])
+    try:
+        os.link(tmp_path, TEST_ID_FILE)
+    except FileExistsError:
+        pass  # 其他进程已抢先创建，以文件中的为准
+    finally:
+        os.unlink(tmp_path)
+    test_id = _read_test_id()
+    if not test_id:
+        raise RuntimeError(f"{TEST_ID_FILE} 内容为空，请删除后重试")
+    return test_id
+
+
+class ExchangeClient:
+    """交易所 HTTP 客户端（aiohttp 异步版本，需在事件循环内创建）
+
+    verbose=True 时打印注册/开户/下单成功日志，失败信息始终打印。
+    """
+
+    def __init__(self, base_url: str = BASE_URL, verbose: bool = False):
+        self.base_url = base_url
+        # 预先拼好各接口 URL，压测循环里不再逐次格式化
+        self._url_health = f"{base_url}/health"
+        self._url_register = f"{base_url}/api/auth/register"
+        self._url_login = f"{base_url}/api/auth/login"
+        self._url_user = f"{base_url}/api/user/"
+        self._url_open = f"{base_url}/api/account/open"
+        self._url_account = f"{base_url}/api/account/"
+        self._url_submit = f"{base_url}/api/order/submit"
+        self._url_cancel = f"{base_url}/api/order/cancel"
+        self._url_order = f"{base_url}/api/order/"
+        self._url_position = f"{base_url}/api/position/account/"
+        self.verbose = verbose
+        # 单 host 场景：连接池上限全部给 127.0.0.1，长连接复用，不读代理环境变量；
+        # 本地明文 HTTP，ssl=False 跳过默认 SSL 上下文的创建与校验
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=32, limit_per_host=32, keepalive_timeout=60, ssl=False
+            ),
+            headers={"Connection": "keep-alive", "Content-Type": "application/json"},
+            trust_env=False,
+        )
+
+    def account_url(self, account_id: str) -> str:
+        return self._url_account + account_id
+
+    def order_url(self, order_id: str) -> str:
+        return self._url_order + order_id
+
+    def position_url(self, account_id: str) -> str:
+        return self._url_position + account_id
+
+    async def close(self):
+        """关闭底层连接池"""
+        await self.session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def health_check(self) -> bool:
+        """健康检查"""
+        try:
+            async with self.session.get(
+                self._url_health, timeout=aiohttp.ClientTimeout(total=2)
+            ) as resp:
+                return resp.status == 200
+        except Exception as e:
+            print(f"健康检查失败: {e}")
+            return False
+
+    async def register_user(self, username: str, password: str = "test123") -> Optional[str]:
+        """注册用户"""
+        payload = {
+            "username": username,
+            "password": password
+        }
+        try:
+            async with self.session.post(self._url_register, data=orjson.dumps(payload)) as resp:
+                status = resp.status
+                body = await resp.read()
+            if status == 200 and _SUCCESS_MARK in body:
+                user_id = _extract_id(_USER_ID_RE, body)
+                if self.verbose:
+                    print(f"[+] 用户注册成功: username={username}, user_id={user_id}")
+                return user_id
+            data = orjson.loads(body)
+            error = data.get("error") or {}
+            # 用户名已存在（服务端返回 400 "Username already exists"）时改为登录取回 user_id
+            if status == 409 or "already exists" in str(error.get("message", "")):
+                return await self.login(username, password)
+            print(f"[-] 用户注册失败: {error.get('message', error)}")
+            return None
+        except Exception as e:
+            print(f"[-] 用户注册异常: {e}")
+            return None
+
+    async def login(self, username: str, password: str = "test123") -> Optional[str]:
+        """登录，返回 user_id"""
+        payload = {
+            "username": username,
+            "password": password
+        }
+        async with self.session.post(self._url_login, data=orjson.dumps(payload)) as resp:
+            data = orjson.loads(await resp.read())
+        if data.get("success") and data["data"].get("success"):
+            user_id = data["data"].get("user_id")
+            if self.verbose:
+                print(f"[+] 用户登录成功: username={username}, user_id={user_id}")
+            return user_id
+        print(f"[-] 用户登录失败: {data.get('error') or data['data'].get('message')}")
+        return None
+
+    async def get_user_accounts(self, user_id: str) -> Optional[list]:
+        """查询用户名下所有账户"""
+        async with self.session.get(self._url_user + user_id + "/accounts") as resp:
+            data = orjson.loads(await resp.read())
+        if data.get("success"):
+            return data["data"].get("accounts", [])
+        return None
+
+    async def ensure_account(
+        self, username: str, account_name: str, init_cash: float = 1000000.0
+    ) -> Optional[Tuple[str, str]]:
+        """获取或创建 (user_id, account_id)：用户已存在则登录，同名账户已存在则直接复用"""
+        user_id = await self.register_user(username)
+        if not user_id:
+            return None
+        for acc in await self.get_user_accounts(user_id) or []:
+            if acc.get("account_name") == account_name:
+                return user_id, acc["account_id"]
+        account_id = await self.open_account(user_id, account_name, init_cash)
+        if not account_id:
+            return None
+        return user_id, account_id
+
+    async def open_account(self, user_id: str, user_name: str, init_cash: float = 1000000.0) -> Optional[str]:
+        """开户"""
+        payload = {
+            "user_id": user_id,
+            "user_name": user_name,
+            "init_cash": init_cash,
+            "account_type": "individual",
+            "password": "test123"
+        }
+        async with self.session.post(self._url_open, data=orjson.dumps(payload)) as resp:
+            ok = resp.status == 200
+            body = await resp.read()
+        if ok and _SUCCESS_MARK in body:
+            account_id = _extract_id(_ACCOUNT_ID_RE, body)
+            if self.verbose:
+                print(f"[+] 开户成功: user_id={user_id}, account_id={account_id}")
+            return account_id
+        else:
+            print(f"[-] 开户失败: {orjson.loads(body).get('error')}")
+            return None
+
+    async def get_account(self, account_id: str) -> Optional[Dict[str, Any]]:
+        """查询账户"""
+        async with self.session.get(self.account_url(account_id)) as resp:
+            data = orjson.loads(await resp.read())
+        if data.get("success"):
+            return data["data"]
+        else:
+            print(f"[-] 查询账户失败: {data.get('error')}")
+            return None
+
+    async def submit_order(
+        self,
+        user_id: str,
+        account_id: str,
+        instrument_id: str,
+        direction: str,  # BUY / SELL
+        offset: str,     # OPEN / CLOSE
+        volume: float,
+        price: float,
+        order_type: str = "LIMIT"
+    ) -> Optional[str]:
+        """提交订单"""
+        payload = {
+            "user_id": user_id,
+            "account_id": account_id,
+            "instrument_id": instrument_id,
+            "direction": direction,
+            "offset": offset,
+            "volume": volume,
+            "price": price,
+            "order_type": order_type
+        }
+        async with self.session.post(self._url_submit, data=orjson.dumps(payload)) as resp:
+            ok = resp.status == 200
+            body = await resp.read()
+        if ok and _SUCCESS_MARK in body:
+            order_id = _extract_id(_ORDER_ID_RE, body)
+            if self.verbose:
+                print(f"[+] 订单提交成功: order_id={order_id}, {direction} {offset} {volume}@{price}")
+            return order_id
+        else:
+            print(f"[-] 订单提交失败: {orjson.loads(body).get('error')}")
+            return None
+
+    async def submit_orders(self, payloads: List[Dict[str, Any]]) -> List[Optional[str]]:
+        """并发提交一批订单（payload 字段同 submit_order 参数），按输入顺序返回 order_id"""
+        return await asyncio.gather(*(self.submit_order(**p) for p in payloads))
+
+    async def cancel_order(self, user_id: str, account_id: str, order_id: str) -> bool:
+        """撤单"""
+        payload = {
+            "user_id": user_id,
+            "account_id": account_id,
+            "order_id": order_id
+        }
+        async with self.session.post(self._url_cancel, data=orjson.dumps(payload)) as resp:
+            return resp.status == 200 and _SUCCESS_MARK in await resp.read()
+
+    async def get_positions(self, account_id: str) -> Optional[list]:
+        """查询持仓"""
+        async with self.session.get(self.position_url(account_id)) as resp:
+            data = orjson.loads(await resp.read())
+        if data.get("success"):
+            return data["data"]
+        else:
+            print(f"[-] 查询持仓失败: {data.get('error')}")
+            return None
+
+    async def get_order(self, order_id: str) -> Optional[Dict[str, Any]]:
+        """查询订单"""
+        async with self.session.get(self.order_url(order_id)) as resp:
+            data = orjson.loads(await resp.read())
+        if data.get("success"):
+            return data["data"]
+        else:
+            return None
+
+    async def wait_until(
+        self,
+        order_id: str,
+        terminal: frozenset = ORDER_FINAL_STATUSES,
+        timeout: float = 2.0,
+    ) -> Optional[Dict[str, Any]]:
+        """轮询订单状态直到进入 terminal 集合，超时返回最后一次查询结果"""
+        deadline = time.monotonic() + timeout
+        delay = 0.01
+        while True:
+            status = await self.get_order(order_id)
+            if status and status.get("status") in terminal:
+                return status
+            if time.monotonic() >= deadline:
+                return status
+            await asyncio.sleep(delay)
+            delay = min(delay * 1.5, 0.1)
+
+    async def _request(self, method: str, url: str, body: Optional[dict] = None) -> Optional[Any]:
+        """发送单个请求，成功返回 data 字段，失败打印错误并返回 None"""
+        data = None if body is None else orjson.dumps(body)
+        async with self.session.request(method, url, data=data) as resp:
+            result = orjson.loads(await resp.read())
+        if result.get("success"):
+            return result["data"]
+        print(f"[-] 请求失败: {method} {url}: {result.get('error')}")
+        return None
+
+    async def get_many(self, requests: List[Tuple[str, str, Optional[dict]]]) -> List[Optional[Any]]:
+        """并发发送一批 (method, url, body) 请求，按输入顺序返回各自的 data
+
+        url 用 account_url / order_url / position_url 等生成。
+        """
+        return await asyncio.gather(
+            *(self._request(method, url, body) for method, url, body in requests)
+        )
+
+
+async def cancel_open_orders(client: ExchangeClient, orders: List[Tuple[str, str, Optional[str]]]):
+    """撤掉用例留在订单簿上的 (user_id, account_id, order_id) 挂单；已成交/已撤单的订单撤单失败，忽略即可"""
+    await asyncio.gather(*(
+        client.cancel_order(user_id, account_id, order_id)
+        for user_id, account_id, order_id in orders
+        if order_id
+    ))
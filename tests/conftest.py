@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+Python 场景测试的 pytest 配置
+@yutiansut @quantaxis
+
+需要先启动 qaexchange-server（默认 127.0.0.1:8094），未启动时整组测试跳过。
+支持 pytest-xdist 并行（pytest tests -s -n auto），每个 worker 各自持有客户端和测试账户。
+
+依赖: pip install aiohttp orjson pytest pytest-asyncio>=0.24 pytest-xdist
+"""
+
+import os
+from types import SimpleNamespace
+
+import pytest
+import pytest_asyncio
+
+from _exchange_client import ExchangeClient, load_test_id
+
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def client():
+    """整个测试会话共用一个客户端，长连接在所有用例间复用；打印注册/开户/下单成功日志"""
+    c = ExchangeClient(verbose=True)
+    if not await c.health_check():
+        await c.close()
+        pytest.skip("qaexchange-server 未启动")
+    yield c
+    await c.close()
+
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def accounts(client):
+    """撤单用例的测试账户：按测试 ID 复用已注册的用户和账户，整个会话只创建一次
+
+    其余场景断言精确持仓，每次运行各自新开账户，不使用本 fixture。
+    """
+    test_id = load_test_id()
+    # xdist 下各 worker 使用独立账户，避免并行用例互相改动冻结资金/持仓
+    worker = os.environ.get("PYTEST_XDIST_WORKER")
+    if worker:
+        test_id = f"{test_id}_{worker}"
+    pair = await client.ensure_account(f"test_a_{test_id}", f"测试账户A_{test_id}")
+    if not pair:
+        pytest.fail("测试账户创建失败")
+    return SimpleNamespace(test_id=test_id, user_id=pair[0], account_id=pair[1])
@@ -17,116 +17,24 @@ HTTP API:
 - POST /api/order/submit - 提交订单
 - POST /api/order/cancel - 撤单
 - GET /api/position/{account_id} - 查询持仓
+
+运行（需先启动 qaexchange-server，fixture 见 conftest.py）:
+    pytest tests/test_all_scenarios.py -s          # 串行
+    pytest tests/test_all_scenarios.py -s -n auto  # pytest-xdist 多进程并行
+
+依赖: pip install aiohttp orjson pytest pytest-asyncio pytest-xdist（客户端见 _exchange_client.py）
 """
 
-import requests
-import json
-import time
+import asyncio
+import sys
 import uuid
-from typing import Optional, Dict, Any, List
-
-BASE_URL = "http://127.0.0.1:8094"
-
-
-class ExchangeClient:
-    """交易所 HTTP 客户端"""
-
-    def __init__(self, base_url: str = BASE_URL):
-        self.base_url = base_url
-        self.session = requests.Session()
-
-    def health_check(self) -> bool:
-        try:
-            resp = self.session.get(f"{self.base_url}/health", timeout=5)
-            return resp.status_code == 200
-        except Exception as e:
-            print(f"健康检查失败: {e}")
-            return False
-
-    def register_user(self, username: str, password: str = "test123") -> Optional[str]:
-        payload = {"username": username, "password": password}
-        try:
-            resp = self.session.post(f"{self.base_url}/api/auth/register", json=payload)
-            data = resp.json()
-            if data.get("success"):
-                return data["data"].get("user_id")
-            return None
-        except:
-            return None
-
-    def open_account(self, user_id: str, user_name: str, init_cash: float = 1000000.0) -> Optional[str]:
-        payload = {
-            "user_id": user_id,
-            "user_name": user_name,
-            "init_cash": init_cash,
-            "account_type": "individual",
-            "password": "test123"
-        }
-        resp = self.session.post(f"{self.base_url}/api/account/open", json=payload)
-        data = resp.json()
-        if data.get("success"):
-            return data["data"].get("account_id")
-        return None
-
-    def get_account(self, account_id: str) -> Optional[Dict[str, Any]]:
-        resp = self.session.get(f"{self.base_url}/api/account/{account_id}")
-        data = resp.json()
-        if data.get("success"):
-            return data["data"]
-        return None
-
-    def submit_order(
-        self,
-        user_id: str,
-        account_id: str,
-        instrument_id: str,
-        direction: str,
-        offset: str,
-        volume: float,
-        price: float,
-        order_type: str = "LIMIT"
-    ) -> Optional[str]:
-        payload = {
-            "user_id": user_id,
-            "account_id": account_id,
-            "instrument_id": instrument_id,
-            "direction": direction,
-            "offset": offset,
-            "volume": volume,
-            "price": price,
-            "order_type": order_type
-        }
-        resp = self.session.post(f"{self.base_url}/api/order/submit", json=payload)
-        data = resp.json()
-        if data.get("success"):
-            return data["data"].get("order_id")
-        else:
-            print(f"[-] 订单提交失败: {data.get('error')}")
-            return None
-
-    def cancel_order(self, user_id: str, account_id: str, order_id: str) -> bool:
-        payload = {
-            "user_id": user_id,
-            "account_id": account_id,
-            "order_id": order_id
-        }
-        resp = self.session.post(f"{self.base_url}/api/order/cancel", json=payload)
-        data = resp.json()
-        return data.get("success", False)
-
-    def get_positions(self, account_id: str) -> Optional[list]:
-        resp = self.session.get(f"{self.base_url}/api/position/account/{account_id}")
-        data = resp.json()
-        if data.get("success"):
-            return data["data"]
-        return None
-
-    def get_order(self, order_id: str) -> Optional[Dict[str, Any]]:
-        resp = self.session.get(f"{self.base_url}/api/order/{order_id}")
-        data = resp.json()
-        if data.get("success"):
-            return data["data"]
-        return None
+
+import pytest
+
+from _exchange_client import ExchangeClient, ORDER_ACCEPTED_STATUSES, cancel_open_orders
+
+# 所有用例与 session 级 client/accounts fixture 共用同一个事件循环
+pytestmark = pytest.mark.asyncio(loop_scope="session")
 
 
 def print_separator(title: str):
@@ -135,179 +43,218 @@ def print_separator(title: str):
     print(f"{'='*60}\n")
 
 
-def test_cancel_order(client: ExchangeClient, user_id: str, account_id: str):
+async def new_account_pair(client: ExchangeClient, tag: str, init_cash: float = 1000000.0):
+    """为单个用例新建一对 A/B 账户，持仓从零开始，不受历次运行累积的状态影响
+
+    用户名是随机的，不可能已存在，直接注册 + 开户，不走 ensure_account 的账户列表查询。
+    """
+    run_id = uuid.uuid4().hex[:8]
+    user_a, user_b = await asyncio.gather(
+        client.register_user(f"test_{tag}_a_{run_id}"),
+        client.register_user(f"test_{tag}_b_{run_id}"),
+    )
+    assert user_a and user_b, "注册用户失败"
+    acc_a, acc_b = await asyncio.gather(
+        client.open_account(user_a, f"{tag}测试A_{run_id}", init_cash=init_cash),
+        client.open_account(user_b, f"{tag}测试B_{run_id}", init_cash=init_cash),
+    )
+    assert acc_a and acc_b, "创建账户失败"
+    return (user_a, acc_a), (user_b, acc_b)
+
+
+def position_of(positions, instrument: str) -> dict:
+    """按合约取持仓，无持仓时返回空 dict"""
+    by_inst = {p['instrument_id']: p for p in positions or []}
+    return by_inst.get(instrument, {})
+
+
+@pytest.mark.parametrize("direction, price", [
+    ("BUY", 3700.0),   # 低于市价的买单
+    ("SELL", 3900.0),  # 高于市价的卖单
+])
+async def test_cancel_order(client: ExchangeClient, accounts, direction: str, price: float):
     """测试撤单功能"""
-    print_separator("测试撤单功能")
+    print_separator(f"测试撤单功能 ({direction})")
+    user_id, account_id = accounts.user_id, accounts.account_id
 
-    # 1. 提交一个买单（价格较低，不会立即成交）
-    low_price = 3700.0  # 低于市价
-    order_id = client.submit_order(
+    # 1. 提交一个挂单（价格偏离市价，不会立即成交）
+    order_id = await client.submit_order(
         user_id=user_id,
         account_id=account_id,
         instrument_id="IF2501",
-        direction="BUY",
+        direction=direction,
         offset="OPEN",
         volume=1.0,
-        price=low_price
+        price=price
     )
 
-    if not order_id:
-        print("[-] 下单失败")
-        return False
+    assert order_id, "下单失败"
 
-    print(f"[+] 订单已提交: {order_id} @ {low_price}")
+    print(f"[+] 订单已提交: {order_id} @ {price}")
 
-    # 2. 查询订单状态
-    time.sleep(0.5)
-    order_status = client.get_order(order_id)
+    # 2. 查询订单状态（等待进入订单簿）
+    order_status = await client.wait_until(order_id, ORDER_ACCEPTED_STATUSES)
     if order_status:
         print(f"    订单状态: {order_status.get('status')}, volume_left={order_status.get('volume_left')}")
 
     # 3. 查询账户资金（应该有冻结）
-    acc_before = client.get_account(account_id)
+    acc_before = await client.get_account(account_id)
     frozen_before = acc_before.get('frozen', 0) if acc_before else 0
     print(f"    冻结资金: {frozen_before:.2f}")
 
     # 4. 撤单
-    success = client.cancel_order(user_id, account_id, order_id)
+    success = await client.cancel_order(user_id, account_id, order_id)
     print(f"    撤单结果: {'成功' if success else '失败'}")
 
     # 5. 验证撤单后资金释放
-    time.sleep(0.5)
-    acc_after = client.get_account(account_id)
+    order_after = await client.wait_until(order_id)
+    acc_after = await client.get_account(account_id)
     frozen_after = acc_after.get('frozen', 0) if acc_after else 0
     print(f"    撤单后冻结: {frozen_after:.2f}")
 
     # 6. 验证订单状态
-    order_after = client.get_order(order_id)
     if order_after:
         print(f"    撤单后订单状态: {order_after.get('status')}")
 
-    return success and frozen_after < frozen_before
+    assert success, "撤单失败"
+    assert frozen_after < frozen_before, "撤单后冻结资金未释放"
 
 
-def test_partial_fill(client: ExchangeClient, user_a: str, acc_a: str, user_b: str, acc_b: str):
-    """测试部分成交（大单 vs 小单）"""
+async def test_partial_fill(client: ExchangeClient):
+    """测试部分成交（大单 vs 小单），新账户保证持仓断言只反映本次成交"""
     print_separator("测试部分成交")
-
-    # 1. A 提交大买单（10手）
-    large_order_id = client.submit_order(
-        user_id=user_a,
-        account_id=acc_a,
-        instrument_id="IF2502",
-        direction="BUY",
-        offset="OPEN",
-        volume=10.0,
-        price=3820.0
-    )
-    print(f"[+] A 提交大买单: {large_order_id}, 10手 @ 3820")
-
-    time.sleep(0.5)
-
-    # 2. B 提交小卖单（3手）- 应该部分成交 A 的订单
-    small_order_id = client.submit_order(
-        user_id=user_b,
-        account_id=acc_b,
-        instrument_id="IF2502",
-        direction="SELL",
-        offset="OPEN",
-        volume=3.0,
-        price=3820.0
-    )
-    print(f"[+] B 提交小卖单: {small_order_id}, 3手 @ 3820")
-
-    time.sleep(1.0)
-
-    # 3. 检查 A 的订单状态（应该部分成交）
-    order_a = client.get_order(large_order_id)
-    if order_a:
-        filled = order_a.get('filled_volume', 0)
-        left = order_a.get('volume_left', 10)
-        status = order_a.get('status')
-        print(f"    A 订单: 已成交={filled}, 剩余={left}, 状态={status}")
-
-        # 部分成交：filled > 0 and left > 0
-        if filled > 0 and left > 0:
-            print(f"    [OK] 部分成交正确！")
-        elif filled == 10:
-            print(f"    [OK] 全部成交（可能有其他订单参与）")
-        else:
-            print(f"    [!] 未成交或状态异常")
-
-    # 4. 检查 B 的订单状态（应该全部成交）
-    order_b = client.get_order(small_order_id)
-    if order_b:
-        filled = order_b.get('filled_volume', 0)
-        status = order_b.get('status')
-        print(f"    B 订单: 已成交={filled}, 状态={status}")
-
-    # 5. 检查持仓
-    pos_a = client.get_positions(acc_a)
-    pos_b = client.get_positions(acc_b)
-
-    print(f"\n    A 持仓: {pos_a}")
-    print(f"    B 持仓: {pos_b}")
-
-    return True
-
-
-def test_close_position(client: ExchangeClient, user_id: str, account_id: str):
-    """测试平仓"""
+    # A 的 10 手 IF2502 @3820 需冻结约 3820×300×10×12% ≈ 137.5 万保证金，默认 100 万入金不够
+    (user_a, acc_a), (user_b, acc_b) = await new_account_pair(client, "partial", init_cash=2_000_000.0)
+
+    # 1. A 大买单（10手）与 B 小卖单（3手）同时提交，不论谁先进订单簿，A 都应部分成交
+    large_payload = {
+        "user_id": user_a,
+        "account_id": acc_a,
+        "instrument_id": "IF2502",
+        "direction": "BUY",
+        "offset": "OPEN",
+        "volume": 10.0,
+        "price": 3820.0,
+    }
+    small_payload = {
+        "user_id": user_b,
+        "account_id": acc_b,
+        "instrument_id": "IF2502",
+        "direction": "SELL",
+        "offset": "OPEN",
+        "volume": 3.0,
+        "price": 3820.0,
+    }
+    large_order_id, small_order_id = await client.submit_orders([large_payload, small_payload])
+
+    try:
+        assert large_order_id, "A 大买单提交失败"
+        assert small_order_id, "B 小卖单提交失败"
+        print(f"[+] A 提交大买单: {large_order_id}, 10手 @ 3820")
+        print(f"[+] B 提交小卖单: {small_order_id}, 3手 @ 3820")
+
+        # 2. 等待 B 的小单成交
+        await client.wait_until(small_order_id)
+
+        # 订单与持仓查询互不依赖，并发发出
+        order_a, order_b, pos_a, pos_b = await asyncio.gather(
+            client.get_order(large_order_id),
+            client.get_order(small_order_id),
+            client.get_positions(acc_a),
+            client.get_positions(acc_b),
+        )
+
+        # 3. 检查 A 的订单状态（应该部分成交 3 手）
+        assert order_a, "A 订单未找到"
+        print(f"    A 订单: 已成交={order_a.get('filled_volume')}, 状态={order_a.get('status')}")
+        assert order_a.get('filled_volume') == 3, "A 大单应部分成交 3 手"
+
+        # 4. 检查 B 的订单状态（应该全部成交）
+        assert order_b, "B 订单未找到"
+        print(f"    B 订单: 已成交={order_b.get('filled_volume')}, 状态={order_b.get('status')}")
+        assert order_b.get('status') == "Filled", "B 小单应全部成交"
+
+        # 5. 检查持仓
+        print(f"\n    A 持仓: {pos_a}")
+        print(f"    B 持仓: {pos_b}")
+        assert position_of(pos_a, "IF2502").get('volume_long') == 3, "A 应持有 3 手多头"
+        assert position_of(pos_b, "IF2502").get('volume_short') == 3, "B 应持有 3 手空头"
+    finally:
+        # 撤掉 A 大单剩余的 7 手（以及万一未成交的 B 单），不把挂单和冻结资金留给下一次运行
+        await cancel_open_orders(client, [
+            (user_a, acc_a, large_order_id),
+            (user_b, acc_b, small_order_id),
+        ])
+
+
+async def test_close_position(client: ExchangeClient):
+    """测试平仓（使用独立的新账户自建持仓，不依赖其他用例留下的状态）"""
     print_separator("测试平仓")
 
-    # 1. 查询当前持仓
-    positions = client.get_positions(account_id)
-    if not positions:
-        print("[-] 无持仓可平")
-        return False
-
-    # 找到有多头持仓的合约
-    long_pos = None
-    for pos in positions:
-        if pos.get('volume_long', 0) > 0:
-            long_pos = pos
-            break
-
-    if not long_pos:
-        print("[-] 无多头持仓可平")
-        return False
-
-    instrument = long_pos['instrument_id']
-    volume = long_pos['volume_long']
-    print(f"[+] 找到多头持仓: {instrument}, {volume}手")
-
-    # 2. 提交卖出平仓订单
-    close_order_id = client.submit_order(
-        user_id=user_id,
-        account_id=account_id,
-        instrument_id=instrument,
-        direction="SELL",
-        offset="CLOSE",
-        volume=volume,
-        price=3800.0  # 假设市价
-    )
-
-    if not close_order_id:
-        print("[-] 平仓订单提交失败")
-        return False
-
-    print(f"[+] 平仓订单已提交: {close_order_id}")
-
-    time.sleep(1.0)
-
-    # 3. 检查订单状态
-    order_status = client.get_order(close_order_id)
-    if order_status:
+    # 0. 新建一对账户，在独立合约上撮合出 A 多 1 手 / B 空 1 手
+    (user_id, account_id), (user_b, acc_b) = await new_account_pair(client, "close")
+    instrument, price = "IH2501", 2800.0
+    order_ids = []
+
+    try:
+        buy_id = await client.submit_order(user_id, account_id, instrument, "BUY", "OPEN", 1.0, price)
+        assert buy_id, "开仓买单提交失败"
+        order_ids.append((user_id, account_id, buy_id))
+        await client.wait_until(buy_id, ORDER_ACCEPTED_STATUSES)
+        sell_id = await client.submit_order(user_b, acc_b, instrument, "SELL", "OPEN", 1.0, price)
+        assert sell_id, "开仓卖单提交失败"
+        order_ids.append((user_b, acc_b, sell_id))
+        await client.wait_until(sell_id)
+
+        # 1. 查询当前持仓
+        positions = await client.get_positions(account_id)
+        assert positions, "无持仓可平"
+
+        # 按合约索引持仓，直接取刚开仓的合约
+        long_pos = position_of(positions, instrument)
+        assert long_pos.get('volume_long', 0) > 0, "无多头持仓可平"
+
+        volume = long_pos['volume_long']
+        print(f"[+] 找到多头持仓: {instrument}, {volume}手")
+
+        # 2. A 卖出平仓，B 买入平仓作为对手方
+        close_order_id = await client.submit_order(
+            user_id=user_id,
+            account_id=account_id,
+            instrument_id=instrument,
+            direction="SELL",
+            offset="CLOSE",
+            volume=volume,
+            price=price
+        )
+        assert close_order_id, "平仓订单提交失败"
+        order_ids.append((user_id, account_id, close_order_id))
+        print(f"[+] 平仓订单已提交: {close_order_id}")
+
+        await client.wait_until(close_order_id, ORDER_ACCEPTED_STATUSES)
+        counter_id = await client.submit_order(user_b, acc_b, instrument, "BUY", "CLOSE", volume, price)
+        assert counter_id, "对手方平仓订单提交失败"
+        order_ids.append((user_b, acc_b, counter_id))
+
+        # 3. 检查订单状态
+        order_status, _ = await asyncio.gather(
+            client.wait_until(close_order_id),
+            client.wait_until(counter_id),
+        )
+        assert order_status, "平仓订单未找到"
         print(f"    订单状态: {order_status.get('status')}, 成交={order_status.get('filled_volume')}")
+        assert order_status.get('status') == "Filled", "平仓订单未成交"
 
-    # 4. 检查持仓是否减少
-    positions_after = client.get_positions(account_id)
-    print(f"    平仓后持仓: {positions_after}")
+        # 4. 检查多头持仓已平掉
+        positions_after = await client.get_positions(account_id)
+        print(f"    平仓后持仓: {positions_after}")
+        assert position_of(positions_after, instrument).get('volume_long', 0) == 0, "平仓后仍有多头持仓"
+    finally:
+        # 撤掉任何未成交的挂单，不把挂单留在 IH2501 订单簿上
+        await cancel_open_orders(client, order_ids)
 
-    return True
 
-
-def main():
+if __name__ == "__main__":
     print("""
     ╔═══════════════════════════════════════════════════════════╗
     ║        QAExchange 完整交易场景测试                         ║
@@ -315,51 +262,4 @@ def main():
     ╚═══════════════════════════════════════════════════════════╝
     """)
 
-    client = ExchangeClient()
-
-    # 1. 健康检查
-    if not client.health_check():
-        print("[-] 服务器未启动")
-        return
-    print("[+] 服务器正常")
-
-    # 2. 创建测试用户和账户
-    test_id = str(uuid.uuid4())[:8]
-
-    user_a = client.register_user(f"test_a_{test_id}")
-    user_b = client.register_user(f"test_b_{test_id}")
-
-    if not user_a or not user_b:
-        print("[-] 用户注册失败")
-        return
-
-    acc_a = client.open_account(user_a, f"测试账户A_{test_id}")
-    acc_b = client.open_account(user_b, f"测试账户B_{test_id}")
-
-    if not acc_a or not acc_b:
-        print("[-] 账户创建失败")
-        return
-
-    print(f"[+] 测试账户已创建: A={acc_a}, B={acc_b}")
-
-    # 3. 测试撤单
-    cancel_result = test_cancel_order(client, user_a, acc_a)
-    print(f"\n撤单测试: {'PASS' if cancel_result else 'FAIL'}")
-
-    # 4. 测试部分成交
-    partial_result = test_partial_fill(client, user_a, acc_a, user_b, acc_b)
-    print(f"\n部分成交测试: {'PASS' if partial_result else 'FAIL'}")
-
-    # 5. 测试平仓（如果有持仓）
-    close_result = test_close_position(client, user_a, acc_a)
-    print(f"\n平仓测试: {'PASS' if close_result else 'SKIP (无持仓)'}")
-
-    # 汇总
-    print_separator("测试汇总")
-    print(f"  撤单功能: {'✓' if cancel_result else '✗'}")
-    print(f"  部分成交: {'✓' if partial_result else '✗'}")
-    print(f"  平仓功能: {'✓' if close_result else '○ (跳过)'}")
-
-
-if __name__ == "__main__":
-    main()
+    sys.exit(pytest.main([__file__, "-v", "-s"]))